@@ -12,11 +12,23 @@ Functionality, Extendibility, Effectiveness) using hardcoded formulas.
 """
 
 import argparse
-import pandas as pd
+import ast
+import logging
+import numpy as np
 import os
+import pandas as pd
 import re
 import sys
 
+try:
+    import pyarrow  # noqa: F401
+    # The pyarrow CSV parser is multi-threaded
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+logger = logging.getLogger(__name__)
+
 # QMOOD metrics
 QMOOD_METRICS = [
     'Reusability',
@@ -39,6 +51,89 @@ QMOOD_FORMULAS = {
     'Effectiveness': "0.2 * ANA + 0.2 * DAM + 0.2 * MOA + 0.2 * MFA + 0.2 * NOP"
 }
 
+# Patterns used to normalize file paths to class names
+_PATH_PREFIX_PATTERN = re.compile(r'^.*[\\/]')
+_JAVA_SUFFIX_PATTERN = re.compile(r'\.java$')
+
+
+def _constant(node):
+    """Return the value of a numeric constant AST node, allowing a leading sign."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return float(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        value = _constant(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    raise ValueError(f"Expected a numeric constant, got {type(node).__name__}")
+
+
+def _linear_terms(node, factor=1.0):
+    """
+    Walk the AST of a linear expression and yield its terms.
+
+    Args:
+        node: AST node of the expression
+        factor: Coefficient the whole expression is multiplied by
+
+    Yields:
+        tuple: (column name, coefficient) for every column reference
+    """
+    if isinstance(node, ast.Name):
+        yield node.id, factor
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        yield from _linear_terms(node.operand, -factor if isinstance(node.op, ast.USub) else factor)
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        yield from _linear_terms(node.left, factor)
+        yield from _linear_terms(node.right, -factor if isinstance(node.op, ast.Sub) else factor)
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        try:
+            coefficient, operand = _constant(node.left), node.right
+        except ValueError:
+            coefficient, operand = _constant(node.right), node.left
+        yield from _linear_terms(operand, factor * coefficient)
+    else:
+        raise ValueError(f"QMOOD formulas must be linear, got {type(node).__name__}")
+
+
+def _parse_formula(formula):
+    """
+    Parse a linear formula such as "c1 * COL1 + c2 * COL2 ..." into its terms.
+
+    Args:
+        formula: Formula string from QMOOD_FORMULAS
+
+    Returns:
+        dict: Mapping of column name to coefficient
+    """
+    terms = {}
+    for col, coefficient in _linear_terms(ast.parse(formula, mode='eval').body):
+        terms[col] = terms.get(col, 0.0) + coefficient
+    return terms
+
+
+def _coefficient_matrix(formula_terms, input_columns):
+    """
+    Build the coefficient matrix of the parsed formulas.
+
+    Args:
+        formula_terms: Mapping of metric name to its parsed formula terms
+        input_columns: List of the column names referenced by the formulas
+
+    Returns:
+        ndarray: Matrix with one row per input column and one column per metric
+    """
+    coefficients = np.zeros((len(input_columns), len(QMOOD_METRICS)))
+    for k, metric in enumerate(QMOOD_METRICS):
+        for col, coefficient in formula_terms[metric].items():
+            coefficients[input_columns.index(col), k] = coefficient
+    return coefficients
+
+
+# The formulas are linear, so all of them are evaluated at once as the matrix
+# product of the input columns with a coefficient matrix (one column per metric)
+_FORMULA_TERMS = {metric: _parse_formula(formula) for metric, formula in QMOOD_FORMULAS.items()}
+QMOOD_INPUT_COLUMNS = sorted({col for terms in _FORMULA_TERMS.values() for col in terms})
+QMOOD_COEFFICIENTS = _coefficient_matrix(_FORMULA_TERMS, QMOOD_INPUT_COLUMNS)
+
 
 def parse_arguments():
     """Parse the command line arguments."""
@@ -46,189 +141,291 @@ def parse_arguments():
     parser.add_argument('base_csv', help='Path to the base CSV file')
     parser.add_argument('override_csv', help='Path to the CSV file with override values')
     parser.add_argument('--output', default='merged-output.csv', 
-                        help='Path to the output CSV file (default: merged-output.csv)')
+                        help='Path to the output file; a .parquet or .feather extension selects '
+                             'that format instead of CSV (default: merged-output.csv)')
     parser.add_argument('--add-columns', 
                         help='Comma-separated list of column names from the override CSV to add to the base CSV')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log every matched row and overridden column')
     return parser.parse_args()
 
 
-def extract_class_name(filepath):
-    """Extract the class name from a file path."""
-    # Get the base filename without extension
-    base_name = os.path.basename(filepath)
-    # Remove the .java extension if present
-    if base_name.endswith('.java'):
-        base_name = base_name[:-5]
-    return base_name
+def read_metrics_csv(path, usecols=None):
+    """
+    Read a metrics CSV file.
+
+    Column dtypes are inferred by pandas, so text and integer columns pass through
+    to the output unchanged; recalculate_qmood_metrics converts the columns it
+    reads to numbers itself.
+
+    The file is parsed with the pyarrow engine when pyarrow is installed and with
+    the default C engine otherwise. Files with repeated column names always use
+    the C engine, which renames the duplicates (e.g. 'WMC', 'WMC.1') instead of
+    returning duplicate labels.
+
+    Args:
+        path: Path to the CSV file
+        usecols: Optional callable returning True for the names of the columns to
+            read; all columns are read by default
+
+    Returns:
+        DataFrame: The CSV data
+    """
+    raw_header = pd.read_csv(path, header=None, nrows=1).iloc[0]
+    engine = 'c' if raw_header.duplicated().any() else CSV_ENGINE
+    columns = None
+    if usecols is not None:
+        columns = [col for col in pd.read_csv(path, nrows=0).columns if usecols(col)]
+    return pd.read_csv(path, usecols=columns, engine=engine)
 
 
-def match_files(row1, row2):
+def write_output(df, path):
     """
-    Determine if two rows match based on class name or file path.
-    
+    Write a DataFrame in the format selected by the file extension of path.
+
+    '.parquet' writes zstd-compressed Parquet and '.feather' writes Feather (both
+    need pyarrow); any other extension writes CSV with two decimal places.
+
     Args:
-        row1: Row from the base CSV
-        row2: Row from the override CSV
-        
+        df: DataFrame to write
+        path: Path to the output file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+    elif extension == '.feather':
+        df.to_feather(path)
+    else:
+        df.to_csv(path, index=False, float_format='%.2f')
+
+
+def extract_class_name(filepaths):
+    """
+    Extract the lowercase class names from a Series of file paths.
+
+    Both '/' and '\\' are treated as path separators, so paths produced on
+    Windows and on Unix normalize to the same class name.
+
+    Args:
+        filepaths: Series of file paths
+
     Returns:
-        bool: True if the rows match, False otherwise
+        Series: The lowercase file names without the .java extension
     """
-    # If we have class names in both CSVs, use them for matching
-    if 'ClassNames' in row1 and 'class' in row2:
-        # Direct match of class names
-        if row1['ClassNames'] == row2['class']:
-            return True
-        
-    # Extract file names for looser matching
-    if 'Name' in row1 and 'file' in row2:
-        base_file = extract_class_name(row1['Name'])
-        override_file = extract_class_name(row2['file'])
-        
-        # Check if the file names match (case insensitive)
-        if base_file.lower() == override_file.lower():
-            return True
-            
-    return False
+    return (filepaths.astype('string')
+            .str.replace(_PATH_PREFIX_PATTERN, '', regex=True)
+            .str.replace(_JAVA_SUFFIX_PATTERN, '', regex=True)
+            .str.lower())
+
+
+def match_rows(base_keys, override_keys):
+    """
+    Find the override row matching each base row by key.
+
+    The lookup is a dict built in a single pass over the override keys; the first
+    override row wins if several share a key. NA keys never match.
+
+    Args:
+        base_keys: Series of keys of the base rows
+        override_keys: Series of keys of the override rows
+
+    Returns:
+        Series: Position of the matching override row for every base row, or NaN
+    """
+    override_rows = {}
+    for j, key in zip(np.flatnonzero(override_keys.notna()), override_keys.dropna()):
+        override_rows.setdefault(key, j)
+    return base_keys.map(override_rows, na_action='ignore')
 
 
 def merge_csvs(base_df, override_df, add_columns=None):
     """
     Merge two DataFrames, overriding values in the base DataFrame with values from
     the override DataFrame where column names match and rows correspond to the same class.
+
+    Rows match when the 'ClassNames' value of the base row equals the 'class' value
+    of the override row. Base rows without such a match fall back to the lowercase
+    class name extracted from the 'Name' and 'file' file paths. If several override
+    rows match a base row, the first one wins.
+
+    The base DataFrame is modified in place instead of being copied, so callers
+    must not rely on its original contents afterwards.
     
     Args:
         base_df: DataFrame containing the base CSV data
         override_df: DataFrame containing the override CSV data
-        add_columns: List of column names from override_df to add to the result_df
+        add_columns: List of column names from override_df to add to base_df
         
     Returns:
-        DataFrame: The merged DataFrame
+        DataFrame: base_df, modified in place
     """
-    # Create a copy of the base DataFrame to modify
-    result_df = base_df.copy()
+    # Remember the original columns before new ones are added, keyed by their
+    # lowercase name for case-insensitive lookups (the first column wins)
+    base_columns = {c.lower(): c for c in reversed(base_df.columns)}
+    base_column_set = set(base_df.columns)
+    add_set = set(add_columns or ())
     
-    # Add columns from override_df to result_df if specified
+    # Add columns from override_df to base_df if specified
     if add_columns:
         for col in add_columns:
-            if col in override_df.columns and col not in result_df.columns:
-                # Add the column to result_df with NaN values
-                result_df[col] = pd.NA
-                print(f"Added new column '{col}' from override CSV to result")
+            if col in override_df.columns and col not in base_df.columns:
+                # Add the column to base_df with NaN values of the override column's
+                # dtype; integers and booleans use the nullable Int64 and boolean
+                # dtypes so unmatched rows stay missing
+                dtype = override_df[col].dtype
+                if pd.api.types.is_bool_dtype(dtype):
+                    dtype = 'boolean'
+                elif pd.api.types.is_integer_dtype(dtype):
+                    dtype = 'Int64'
+                base_df[col] = pd.Series(index=base_df.index, dtype=dtype)
+                logger.debug("Added new column '%s' from override CSV to result", col)
+    
+    # Map each override column onto the result column it should be written to:
+    # either a column we're adding from override_df or a column that exists in
+    # both DataFrames (with case-insensitive matching)
+    target_cols = {}
+    for col in override_df.columns:
+        if col in add_set:
+            target_cols[col] = col
+        elif col.lower() in base_columns:
+            target_cols[col] = base_columns[col.lower()]
     
-    # Keep track of which override rows were used
-    used_override_rows = set()
+    # Look up the override row of every base row: first by the exact qualified
+    # class name, then by the file name for the rows still unmatched
+    override_positions = pd.Series(np.nan, index=base_df.index)
+    if 'ClassNames' in base_df.columns and 'class' in override_df.columns:
+        override_positions = match_rows(base_df['ClassNames'].astype('string'),
+                                        override_df['class'].astype('string'))
+    if 'Name' in base_df.columns and 'file' in override_df.columns:
+        override_positions = override_positions.fillna(
+            match_rows(extract_class_name(base_df['Name']), extract_class_name(override_df['file'])))
+    matched = override_positions.notna()
+    rows = override_positions[matched].astype(int).to_numpy()
+    
+    if len(rows) and logger.isEnabledFor(logging.DEBUG):
+        name_col = 'Name' if 'Name' in base_df.columns else 'ClassNames'
+        file_col = 'file' if 'file' in override_df.columns else 'class'
+        base_names = base_df.loc[matched, name_col]
+        override_names = override_df[file_col].to_numpy()[rows]
+        for name, file_name in zip(base_names, override_names):
+            logger.debug("Found match: %s - %s", name, file_name)
+    
+    # Override the values of the matched rows with one bulk write per column
+    for col, target_col in target_cols.items():
+        values = override_df[col].to_numpy()[rows]
+        try:
+            base_df.loc[matched, target_col] = values
+        except TypeError:
+            # The values don't fit the column's inferred dtype (e.g. floats into
+            # an integer column), so let pandas upcast the column
+            matched_values = pd.Series(values, index=base_df.index[matched])
+            base_df[target_col] = base_df[target_col].mask(matched, matched_values)
+        is_new_column = col in add_set and col not in base_column_set
+        logger.debug("  %s %s with value from %s", 'Adding' if is_new_column else 'Overriding', target_col, col)
     
-    # For each row in the base DataFrame
-    for i, base_row in base_df.iterrows():
-        # For each row in the override DataFrame
-        for j, override_row in override_df.iterrows():
-            if match_files(base_row, override_row):
-                print(f"Found match: {base_row.get('Name', '')} - {override_row.get('file', '')}")
-                
-                # For each column in the override DataFrame
-                for col in override_df.columns:
-                    # If this is a column we're adding from override_df or
-                    # the column exists in both DataFrames (with case-insensitive matching)
-                    should_add = False
-                    if add_columns is not None and col in add_columns:
-                        should_add = True
-                        target_col = col
-                    else:
-                        # For existing columns, find the matching column in base_df
-                        matching_cols = [c for c in base_df.columns if c.lower() == col.lower()]
-                        if matching_cols:
-                            should_add = True
-                            target_col = matching_cols[0]
-                    
-                    if should_add:
-                        # Override the value in the result DataFrame
-                        result_df.at[i, target_col] = override_row[col]
-                        is_new_column = add_columns is not None and col in add_columns and col not in base_df.columns
-                        print(f"  {'Adding' if is_new_column else 'Overriding'} {target_col} with value from {col}")
-                
-                used_override_rows.add(j)
-                break  # Move to next base row after finding a match
+    logger.info("Matched %d/%d base rows; overrode %d cells",
+                len(rows), len(base_df), len(rows) * len(target_cols))
     
-    # Print warning for override rows that weren't used
-    unused_rows = set(range(len(override_df))) - used_override_rows
-    if unused_rows:
-        print(f"\nWarning: {len(unused_rows)} rows in the override CSV were not matched:")
-        for j in unused_rows:
-            row = override_df.iloc[j]
-            class_name = row.get('class', 'Unknown')
-            file_name = row.get('file', 'Unknown')
-            print(f"  - {class_name} ({file_name})")
+    # Warn about override rows that weren't used
+    unused_mask = np.isin(np.arange(len(override_df)), rows, invert=True)
+    if unused_mask.any():
+        unused_rows = override_df.reindex(columns=['class', 'file'], fill_value='Unknown')[unused_mask]
+        logger.warning("%d rows in the override CSV were not matched:\n%s",
+                       len(unused_rows), unused_rows.to_string(index=False))
     
-    return result_df
+    return base_df
 
 
 def recalculate_qmood_metrics(df):
     """
     Recalculate QMOOD metrics using the hardcoded formulas.
+
+    All metrics are computed at once as the product of the input columns with
+    QMOOD_COEFFICIENTS. Missing input columns and missing values contribute 0.
+    The metric columns are assigned onto df in place instead of onto a copy.
     
     Args:
         df: DataFrame containing the merged data
         
     Returns:
-        DataFrame: The DataFrame with recalculated QMOOD metrics
+        DataFrame: df with recalculated QMOOD metrics
     """
-    result_df = df.copy()
+    for metric in QMOOD_METRICS:
+        logger.debug("Recalculating %s using formula: %s", metric, QMOOD_FORMULAS[metric])
     
-    # Process each QMOOD metric using its formula
-    for metric, formula in QMOOD_FORMULAS.items():
-        try:
-            print(f"Recalculating {metric} using formula: {formula}")
-            
-            # Replace column names with DataFrame references
-            expr = formula
-            for col in df.columns:
-                if col in expr:
-                    # Use word boundaries to avoid replacing substrings of other column names
-                    pattern = r'\b' + re.escape(col) + r'\b'
-                    expr = re.sub(pattern, f"df['{col}']", expr)
-            
-            # Evaluate the expression safely
-            result_df[metric] = eval(expr)
-            print(f"  Successfully recalculated {metric}")
-            
-        except Exception as e:
-            print(f"  Error calculating {metric}: {e}", file=sys.stderr)
-            if metric in result_df.columns:
-                print(f"  Keeping original values for {metric}")
+    missing_cols = [col for col in QMOOD_INPUT_COLUMNS if col not in df.columns]
+    if missing_cols:
+        logger.warning("Columns not found, treating them as 0: %s", ', '.join(missing_cols))
+    
+    try:
+        inputs = (df.reindex(columns=QMOOD_INPUT_COLUMNS)
+                  .apply(pd.to_numeric, errors='coerce')
+                  .to_numpy(dtype=np.float64, na_value=0.0))
+        df[QMOOD_METRICS] = inputs @ QMOOD_COEFFICIENTS
+        logger.info("Successfully recalculated QMOOD metrics")
+        
+    except Exception as e:
+        logger.error("Could not calculate QMOOD metrics: %s", e)
+        for metric in QMOOD_METRICS:
+            if metric in df.columns:
+                logger.info("  Keeping original values for %s", metric)
             else:
-                print(f"  Setting {metric} to 0.0")
-                result_df[metric] = 0.0
+                logger.info("  Setting %s to 0.0", metric)
+                df[metric] = 0.0
     
-    return result_df
+    return df
+
+
+def setup_logging(verbose):
+    """
+    Send progress messages to stdout and warnings and errors, prefixed with their
+    level name, to stderr.
+
+    Args:
+        verbose: Whether to also log DEBUG messages
+    """
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.addFilter(lambda record: record.levelno < logging.WARNING)
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setLevel(logging.WARNING)
+    stderr_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO, format='%(message)s',
+                        handlers=[stdout_handler, stderr_handler])
 
 
 def main():
     # Parse command line arguments
     args = parse_arguments()
+    setup_logging(args.verbose)
     
     try:
         # Read the CSV files
-        print(f"Reading base CSV: {args.base_csv}")
-        base_df = pd.read_csv(args.base_csv)
-        
-        print(f"Reading override CSV: {args.override_csv}")
-        override_df = pd.read_csv(args.override_csv)
+        logger.info("Reading base CSV: %s", args.base_csv)
+        base_df = read_metrics_csv(args.base_csv)
         
         # Parse add-columns argument
         add_columns = None
         if args.add_columns:
             add_columns = [col.strip() for col in args.add_columns.split(',')]
         
+        # Only read the override columns used for matching, overriding or adding
+        logger.info("Reading override CSV: %s", args.override_csv)
+        base_columns = {col.lower() for col in base_df.columns}
+        override_columns = {'file', 'class'} | set(add_columns or ())
+        override_df = read_metrics_csv(
+            args.override_csv,
+            usecols=lambda col: col in override_columns or col.lower() in base_columns)
+        
         # Merge the CSV files
-        print("\nMerging CSVs...")
+        logger.info("Merging CSVs...")
         merged_df = merge_csvs(base_df, override_df, add_columns)
         
-        # Recalculate QMOOD metrics
-        print("\nRecalculating QMOOD metrics using hardcoded formulas...")
+        # Recalculate QMOOD metrics; both steps modify base_df in place
+        logger.info("Recalculating QMOOD metrics using hardcoded formulas...")
         merged_df = recalculate_qmood_metrics(merged_df)
         
         # Round QMOOD metrics to two decimal places
-        print("Rounding QMOOD metrics to two decimal places...")
+        logger.info("Rounding QMOOD metrics to two decimal places...")
         for metric in QMOOD_METRICS:
             if metric in merged_df.columns:
                 # Convert to numeric first to ensure proper rounding
@@ -236,14 +433,14 @@ def main():
                 # Apply rounding and format to ensure two decimal places
                 merged_df[metric] = merged_df[metric].apply(lambda x: round(x, 2) if pd.notnull(x) else x)
         
-        # Save the merged DataFrame to a CSV file
-        print(f"\nSaving merged CSV to: {args.output}")
-        merged_df.to_csv(args.output, index=False, float_format='%.2f')
+        # Save the merged DataFrame
+        logger.info("Saving merged data to: %s", args.output)
+        write_output(merged_df, args.output)
         
-        print("Processing completed successfully")
+        logger.info("Processing completed successfully")
         
     except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
+        logger.error("%s", e)
         sys.exit(1)
 
 